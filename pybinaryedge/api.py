@@ -12,12 +12,51 @@
 
 """
 
-import ipaddress
-from typing import Any, Dict
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import (Any, ContextManager, Dict, Iterable, NamedTuple,
+                    Optional, Tuple)
 
 import requests
 import urllib3
 
+from .iputils import normalize_ip
+from .profiling import Profiler
+
+# Types of statistics available with stats()
+STATS_TYPES = [
+    'ports', 'products', 'versions', 'tags', 'services', 'countries', 'asn'
+]
+
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+def _cache_ttl(cache_control: str, default: float) -> Optional[float]:
+    """
+    Returns:
+        the number of seconds a response can be used without revalidation
+        according to its Cache-Control header, 0 to revalidate it every
+        time, or None if it must not be stored
+    """
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    max_age = MAX_AGE.search(cache_control)
+    return int(max_age.group(1)) if max_age else default
+
+
+class _CacheEntry(NamedTuple):
+    ts: float
+    data: Any
+    ttl: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+
 
 class BinaryEdgeException(Exception):
     """
@@ -46,10 +85,31 @@ class BinaryEdge(object):
     Args:
         key: The BinaryEdge API key
         verify: Enable or disable SSL verification. Default is enabled.
+        cache_ttl: Number of seconds successful responses are kept in
+            memory and returned without a new request, unless the API
+            gives a Cache-Control max-age. Stale responses with an ETag or
+            Last-Modified header are revalidated with a conditional
+            request. Default is 0 (no cache). Cached dicts are shared
+            between callers.
+        cache_size: Maximum number of responses in the cache, the least
+            recently used are dropped first. Default is 1024.
+        profile: Record the time spent in each phase of the requests in
+            self.profiler (see pybinaryedge.profiling). Default is disabled.
     """
 
-    def __init__(self, key: str, verify: bool = True):
+    def __init__(
+            self,
+            key: str,
+            verify: bool = True,
+            cache_ttl: float = 0,
+            profile: bool = False,
+            cache_size: int = 1024):
         self.key = key
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.profiler: Optional[Profiler] = Profiler() if profile else None
+        self._cache: 'OrderedDict[Tuple, _CacheEntry]' = OrderedDict()
+        self._cache_lock = threading.Lock()
         self.base_url = 'https://api.binaryedge.io/v2/'
         self.ua = 'pybinaryedge https://github.com/Te-k/pybinaryedge'
         self.requests = requests.Session()
@@ -57,13 +117,76 @@ class BinaryEdge(object):
         if not verify:
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+    def _phase(self, name: str) -> ContextManager:
+        if self.profiler:
+            return self.profiler.phase(name)
+        return nullcontext()
+
+    def _cache_get(self, key: Tuple) -> Optional[_CacheEntry]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_set(self, key: Tuple, entry: Optional[_CacheEntry]):
+        with self._cache_lock:
+            if entry is None:
+                self._cache.pop(key, None)
+                return
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
     def _get(self, url: str, params: Dict[str, Any] = {}):
         headers = {'X-Key': self.key, 'User-Agent': self.ua}
-        r = self.requests.get(
-            self.base_url + url,
-            params=params, headers=headers)
+        entry = None
+        if self.cache_ttl:
+            key = (url, tuple(sorted(params.items())))
+            entry = self._cache_get(key)
+            if entry:
+                if time.time() - entry.ts < entry.ttl:
+                    return entry.data
+                if entry.etag:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    headers['If-Modified-Since'] = entry.last_modified
+        # When profiling, the body is streamed to time its download apart
+        # from connecting and waiting for the headers
+        with self._phase('connect/wait'):
+            r = self.requests.get(
+                self.base_url + url,
+                params=params, headers=headers,
+                stream=self.profiler is not None)
+        with self._phase('download'):
+            r.content
+        if r.status_code == 304 and entry:
+            # Not modified, the stored response is fresh again for the
+            # lifetime given by the new headers
+            ttl = _cache_ttl(r.headers.get('Cache-Control', ''), entry.ttl)
+            self._cache_set(key, None if ttl is None else entry._replace(
+                ts=time.time(),
+                ttl=ttl,
+                etag=r.headers.get('ETag', entry.etag),
+                last_modified=r.headers.get(
+                    'Last-Modified', entry.last_modified)
+            ))
+            return entry.data
         if r.status_code == 200:
-            return r.json()
+            with self._phase('decode'):
+                data = r.json()
+            if self.cache_ttl:
+                ttl = _cache_ttl(
+                    r.headers.get('Cache-Control', ''), self.cache_ttl)
+                self._cache_set(key, None if ttl is None else _CacheEntry(
+                    time.time(),
+                    data,
+                    ttl,
+                    r.headers.get('ETag'),
+                    r.headers.get('Last-Modified')
+                ))
+            return data
         else:
             if r.status_code == 404:
                 raise BinaryEdgeNotFound()
@@ -83,17 +206,13 @@ class BinaryEdge(object):
             a string containing the IP address without bracket
 
         Raises:
-            ValueError: if the string given is not a valid IPv4 address
+            ValueError: if the string given is not a valid IP address or CIDR
         """
         try:
-            return str(ipaddress.ip_address(ip))
-        except:  # noqa: E722
-            pass
-
-        try:
-            return str(ipaddress.ip_network(ip, strict=False))
-        except:  # noqa: E722
-            raise ValueError('Invalid IP address')
+            with self._phase('validate'):
+                return normalize_ip(ip)
+        except ValueError as e:
+            raise ValueError('Invalid IP address: %s' % e) from e
 
     def host(self, ip: str) -> Dict[str, Any]:
         """
@@ -500,8 +619,7 @@ class BinaryEdge(object):
         Raises:
             BinaryEdgeException: if anything else than 200 is returned
         """
-        if type not in ['ports', 'products', 'versions', 'tags',
-                        'services', 'countries', 'asn']:
+        if type not in STATS_TYPES:
             raise BinaryEdgeException('Invalid type')
         return self._get(
             'query/search/stats',
@@ -511,3 +629,52 @@ class BinaryEdge(object):
                 'page': page
             }
         )
+
+    def stats_sweep(
+            self,
+            queries: Iterable[str],
+            types: Optional[Iterable[str]] = None,
+            page: int = 1,
+            workers: int = 8) -> Dict[str, Dict[str, Any]]:
+        """
+        Statistics for many queries and types, requested concurrently.
+        Each distinct (query, type) is requested once, and cached responses
+        are reused when the client has a cache_ttl. A failed request does
+        not fail the sweep, its exception is returned in place of its
+        result.
+
+        Args:
+            queries: Strings used to query our data
+            types: Types of statistic (default is all the types of stats)
+            page: page result (default is 1)
+            workers: Number of concurrent requests
+
+        Returns:
+            A dict query -> type -> dict created from the JSON returned by
+            BinaryEdge, or the BinaryEdgeException or
+            requests.RequestException raised for this query and type
+
+        Raises:
+            BinaryEdgeException: if a type is not correct
+
+        Example:
+            be.stats_sweep(['product:nginx', 'port:22'], ['countries', 'asn'])
+        """
+        types = list(types) if types is not None else STATS_TYPES
+        for t in types:
+            if t not in STATS_TYPES:
+                raise BinaryEdgeException('Invalid type')
+        combinations = dict.fromkeys((q, t) for q in queries for t in types)
+        res: Dict[str, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures: Dict[Tuple[str, str], Future] = {
+                (q, t): executor.submit(self.stats, q, t, page)
+                for q, t in combinations
+            }
+            for (query, t), future in futures.items():
+                try:
+                    result = future.result()
+                except (BinaryEdgeException, requests.RequestException) as e:
+                    result = e
+                res.setdefault(query, {})[t] = result
+        return res
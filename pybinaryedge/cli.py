@@ -1,10 +1,15 @@
 import argparse
 import configparser
+import cProfile
 import json
 import os
 import sys
+from contextlib import nullcontext
 
 from .api import BinaryEdge, BinaryEdgeException, BinaryEdgeNotFound
+from . import workqueue
+from .iputils import validate_ips
+from .storage import write_ndjson
 
 
 def main():
@@ -13,6 +18,19 @@ def main():
         '--no-verify', '-nv', action='store_false',
         help='Disable SSL verification'
     )
+    parser.add_argument(
+        '--save', '-S',
+        help='Append responses to a NDJSON file, compressed if it ends with '
+        '.gz, .xz or .zst'
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Print the time spent in each phase on stderr'
+    )
+    parser.add_argument(
+        '--profile-dump', metavar='FILE',
+        help='Write cProfile statistics in FILE (readable with pstats)'
+    )
     subparsers = parser.add_subparsers(help='Commands')
     parser_a = subparsers.add_parser('config', help='Configure pybinary edge')
     parser_a.add_argument('--key', '-k', help='Configure the API key')
@@ -83,6 +101,44 @@ def main():
         help='Returns subdomains'
     )
     parser_e.set_defaults(which='domain')
+    parser_f = subparsers.add_parser(
+        'bulk',
+        help='Query a list of targets with a pool of processes'
+    )
+    parser_f.add_argument(
+        'FILE', nargs='?',
+        help='File with one target per line'
+    )
+    parser_f.add_argument(
+        '--output', '-o', required=True,
+        help='NDJSON file where results are written, compressed if it ends '
+        'with .gz, .xz or .zst (except in worker mode)'
+    )
+    parser_f.add_argument(
+        '--method', '-m', default='host', choices=workqueue.METHODS,
+        help='Method used for each target (default is host)'
+    )
+    parser_f.add_argument(
+        '--processes', '-P', type=int,
+        help='Number of worker processes (default is the number of CPUs)'
+    )
+    parser_f.add_argument(
+        '--queue', '-q',
+        help='SQLite queue shared between workers (default is OUTPUT.queue)'
+    )
+    parser_f.add_argument(
+        '--rate', '-r', type=float,
+        help='Maximum number of requests per second for all workers'
+    )
+    parser_f.add_argument(
+        '--collapse', '-c', action='store_true',
+        help='Merge IP addresses into CIDR ranges (up to /24)'
+    )
+    parser_f.add_argument(
+        '--worker', '-w', action='store_true',
+        help='Only process an existing queue, to add a machine to a job'
+    )
+    parser_f.set_defaults(which='bulk')
     args = parser.parse_args()
 
     configfile = os.path.expanduser('~/.config/binaryedge')
@@ -106,11 +162,21 @@ def main():
                 sys.exit(1)
             config = configparser.ConfigParser()
             config.read(configfile)
+            profiler = None
+            if args.profile_dump:
+                cprofile = cProfile.Profile()
+                cprofile.enable()
             try:
                 be = BinaryEdge(
                     config['BinaryEdge']['key'],
-                    args.no_verify
+                    args.no_verify,
+                    profile=args.profile
                 )
+                profiler = be.profiler
+
+                def phase(name):
+                    return profiler.phase(name) if profiler else nullcontext()
+
                 if args.which == 'ip':
                     if args.score:
                         res = be.host_score(args.IP)
@@ -127,7 +193,6 @@ def main():
                         res = be.domain_ip(args.IP, page=args.page)
                     else:
                         res = be.host(args.IP)
-                    print(json.dumps(res, sort_keys=True, indent=4))
                 elif args.which == 'search':
                     if args.image:
                         res = be.image_search(args.SEARCH, page=args.page)
@@ -135,26 +200,85 @@ def main():
                         res = be.domain_search(args.SEARCH, page=args.page)
                     else:
                         res = be.host_search(args.SEARCH, page=args.page)
-                    print(json.dumps(res, sort_keys=True, indent=4))
                 elif args.which == 'dataleaks':
                     if args.domain:
                         res = be.dataleaks_organization(args.EMAIL)
                     else:
                         res = be.dataleaks_email(args.EMAIL)
-                    print(json.dumps(res, sort_keys=True, indent=4))
                 elif args.which == 'domain':
                     if args.subdomains:
                         res = be.domain_subdomains(args.DOMAIN, page=args.page)
                     else:
                         res = be.domain_dns(args.DOMAIN, page=args.page)
-                    print(json.dumps(res, sort_keys=True, indent=4))
+                elif args.which == 'bulk':
+                    if args.worker:
+                        if not args.queue:
+                            print('Worker mode requires --queue')
+                            sys.exit(1)
+                        with phase('workers'):
+                            count = workqueue.worker(
+                                config['BinaryEdge']['key'], args.queue,
+                                args.output, method=args.method,
+                                rate=args.rate, verify=args.no_verify
+                            )
+                        queue = workqueue.SQLiteQueue(args.queue)
+                        pending = queue.pending()
+                        queue.close()
+                        if pending:
+                            print(
+                                '%i targets left to other workers' % pending,
+                                file=sys.stderr
+                            )
+                    else:
+                        if not args.FILE:
+                            print('Please provide a file of targets')
+                            sys.exit(1)
+                        with open(args.FILE) as f, phase('validate'):
+                            if args.method in workqueue.IP_METHODS:
+                                result = validate_ips(
+                                    f, collapse=args.collapse
+                                )
+                                for lineno, line, reason in result.invalid:
+                                    print(
+                                        'Line %i: invalid IP %s (%s)' % (
+                                            lineno, line, reason
+                                        ),
+                                        file=sys.stderr
+                                    )
+                                targets = result.valid
+                            else:
+                                targets = [
+                                    line.strip() for line in f
+                                    if line.strip()
+                                ]
+                        with phase('workers'):
+                            count = workqueue.run(
+                                config['BinaryEdge']['key'], targets,
+                                args.output, method=args.method,
+                                processes=args.processes,
+                                queue=args.queue, rate=args.rate,
+                                verify=args.no_verify, validate=False
+                            )
+                    print('%i results written in %s' % (count, args.output))
                 else:
                     parser.print_help()
+                if args.which in ['ip', 'search', 'dataleaks', 'domain']:
+                    with phase('print'):
+                        print(json.dumps(res, sort_keys=True, indent=4))
+                    if args.save:
+                        with phase('save'):
+                            write_ndjson(args.save, [res])
             except ValueError as e:
-                print('Invalid Value: %s' % e.message)
+                print('Invalid Value: %s' % e)
             except BinaryEdgeNotFound:
                 print('Search term not found')
             except BinaryEdgeException as e:
                 print('Error: %s' % e.message)
+            finally:
+                if profiler:
+                    print(profiler.summary(), file=sys.stderr)
+                if args.profile_dump:
+                    cprofile.disable()
+                    cprofile.dump_stats(args.profile_dump)
     else:
         parser.print_help()
@@ -0,0 +1,244 @@
+"""
+    pybinaryedge.dataleaks
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Check large lists of email addresses and domains against the BinaryEdge
+    dataleaks database, and summarize exposure per domain.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from .api import BinaryEdge, BinaryEdgeException, BinaryEdgeNotFound
+
+
+def normalize_email(email: str) -> str:
+    """
+    Normalize an email address: strip, case-fold and remove the
+    plus-addressing suffix of the local part (name+tag@domain)
+
+    Raises:
+        ValueError: if the string is not an email address
+    """
+    email = email.strip().casefold()
+    local, sep, domain = email.rpartition('@')
+    if not sep or not local or not domain:
+        raise ValueError('Invalid email address %s' % email)
+    local = local.split('+', 1)[0]
+    return '%s@%s' % (local, domain)
+
+
+def email_hash(email: str) -> str:
+    """
+    Returns:
+        the SHA256 of a normalized email address, used as cache key
+    """
+    return hashlib.sha256(email.encode()).hexdigest()
+
+
+class NegativeCache(object):
+    """
+    Cache of email addresses not found in dataleaks, stored as hashes so
+    that the cache file does not contain addresses
+
+    Args:
+        path: JSON file where the cache is persisted, None to keep it in
+            memory only
+        ttl: number of seconds a negative result is trusted
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self.entries: Dict[str, float] = {}
+        if path and os.path.isfile(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def __contains__(self, email: str) -> bool:
+        ts = self.entries.get(email_hash(email))
+        return ts is not None and time.time() - ts < self.ttl
+
+    def add(self, email: str):
+        self.entries[email_hash(email)] = time.time()
+
+    def save(self):
+        """
+        Write the cache to its file, dropping expired entries
+        """
+        if not self.path:
+            return
+        now = time.time()
+        self.entries = {
+            k: ts for k, ts in self.entries.items() if now - ts < self.ttl
+        }
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f)
+
+
+class DataleaksChecker(object):
+    """
+    Bulk checker of email addresses and domains. Invalid addresses and
+    failed requests do not stop a check, they are listed in self.invalid
+    as (line number, line, reason) and in self.errors as (address or
+    domain, error).
+
+    Args:
+        be: BinaryEdge client
+        workers: number of concurrent requests
+        cache: cache of addresses not found (default is an in-memory cache)
+    """
+
+    def __init__(
+            self,
+            be: BinaryEdge,
+            workers: int = 8,
+            cache: Optional[NegativeCache] = None):
+        self.be = be
+        self.workers = workers
+        self.cache = cache if cache is not None else NegativeCache()
+        self._info: Optional[Dict[str, Dict[str, Any]]] = None
+        self.invalid: List[Tuple[int, str, str]] = []
+        self.errors: List[Tuple[str, str]] = []
+
+    def _email(self, email: str) -> Optional[Dict[str, Any]]:
+        if email in self.cache:
+            return None
+        try:
+            return self.be.dataleaks_email(email)
+        except BinaryEdgeNotFound:
+            self.cache.add(email)
+            return None
+
+    def _fetch(
+            self,
+            call: Callable[[str], Optional[Dict[str, Any]]],
+            targets: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures: Dict[str, Future] = {
+                t: executor.submit(call, t) for t in targets}
+            for target, future in futures.items():
+                try:
+                    results[target] = future.result()
+                except (BinaryEdgeException, requests.RequestException) as e:
+                    self.errors.append((target, str(e)))
+        return results
+
+    def check_emails(self, emails: Iterable[str]) \
+            -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Check email addresses, normalized and deduplicated. Empty lines are
+        ignored, invalid addresses are added to self.invalid and failed
+        requests to self.errors.
+
+        Args:
+            emails: list of email addresses, one per line
+
+        Returns:
+            a dict normalized email -> result of dataleaks_email, or None
+            if the address was not found
+        """
+        unique: Dict[str, None] = {}
+        for lineno, line in enumerate(emails, 1):
+            if not line.strip():
+                continue
+            try:
+                unique[normalize_email(line)] = None
+            except ValueError as e:
+                self.invalid.append((lineno, line.rstrip('\n'), str(e)))
+        try:
+            return self._fetch(self._email, unique)
+        finally:
+            # Keep the addresses not found so far even if interrupted
+            self.cache.save()
+
+    def _organization(self, domain: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.be.dataleaks_organization(domain)
+        except BinaryEdgeNotFound:
+            return None
+
+    def check_domains(self, domains: Iterable[str]) \
+            -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Check domains with dataleaks_organization, failed requests are
+        added to self.errors
+
+        Returns:
+            a dict domain -> result of dataleaks_organization, or None if
+            the domain was not found
+        """
+        unique = dict.fromkeys(
+            d.strip().casefold() for d in domains if d.strip())
+        return self._fetch(self._organization, unique)
+
+    def leaks_info(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            the catalog of dataleaks_info indexed by leak name, requested
+            once per checker
+        """
+        if self._info is None:
+            info = self.be.dataleaks_info()
+            self._info = {
+                leak['leak']: leak
+                for leak in info.get('events', []) if 'leak' in leak
+            }
+        return self._info
+
+    def summary(
+            self,
+            emails: Iterable[str],
+            organizations: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-domain exposure summary of a list of email addresses
+
+        Args:
+            emails: list of email addresses
+            organizations: also query dataleaks_organization for each domain
+
+        Returns:
+            a dict domain -> {'checked', 'exposed', 'errors', 'leaks',
+            'organization'} where errors is the number of addresses whose
+            request failed and leaks maps each leak name to the number of
+            exposed addresses and the leak details from dataleaks_info
+        """
+        start = len(self.errors)
+        results = self.check_emails(emails)
+        info = self.leaks_info()
+        domains: Dict[str, Dict[str, Any]] = {}
+        for email, _ in self.errors[start:]:
+            domain = email.rpartition('@')[2]
+            summary = domains.setdefault(
+                domain, {'checked': 0, 'exposed': 0, 'errors': 0, 'leaks': {}})
+            summary['errors'] += 1
+        for email, result in results.items():
+            domain = email.rpartition('@')[2]
+            summary = domains.setdefault(
+                domain, {'checked': 0, 'exposed': 0, 'errors': 0, 'leaks': {}})
+            summary['checked'] += 1
+            if not result or not result.get('events'):
+                continue
+            summary['exposed'] += 1
+            leaks: List[str] = [
+                e['leak'] for e in result['events'] if 'leak' in e]
+            for leak in set(leaks):
+                entry = summary['leaks'].setdefault(
+                    leak, {'count': 0, 'info': info.get(leak)})
+                entry['count'] += 1
+        if organizations:
+            orgs = self.check_domains(domains)
+            for domain in domains:
+                domains[domain]['organization'] = orgs.get(domain)
+        return domains
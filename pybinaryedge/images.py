@@ -0,0 +1,238 @@
+"""
+    pybinaryedge.images
+    ~~~~~~~~~~~~~~~~~~~
+
+    Download screenshots found by image_search concurrently, deduplicated
+    by content hash, and index their OCR text and tags for offline search.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED, Future,
+                                ThreadPoolExecutor, wait)
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+from .api import BinaryEdge, BinaryEdgeException
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text: Any) -> Set[str]:
+    """
+    Split OCR text (a string or a list of strings) in lower case words
+    """
+    if isinstance(text, list):
+        text = ' '.join(str(t) for t in text)
+    return set(TOKEN.findall(str(text).lower()))
+
+
+def iter_image_events(
+        be: BinaryEdge,
+        query: str,
+        max_pages: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the events of an image_search query, one page at a time
+
+    Args:
+        be: BinaryEdge client
+        query: image search query
+        max_pages: maximum number of pages requested
+    """
+    for page in range(1, max_pages + 1):
+        res = be.image_search(query, page=page)
+        events = res.get('events', [])
+        if not events:
+            return
+        yield from events
+        if page * res.get('pagesize', len(events)) >= res.get('total', 0):
+            return
+
+
+class ImageIndex(object):
+    """
+    Inverted index of images by OCR words and tags. Images are identified
+    by the SHA256 of their content.
+    """
+
+    def __init__(self):
+        self.images: Dict[str, Dict[str, Any]] = {}
+        self.words: Dict[str, Set[str]] = {}
+        self.tags: Dict[str, Set[str]] = {}
+
+    def add(self, digest: str, event: Dict[str, Any], path: str):
+        """
+        Index an image. The targets, OCR words and tags of events with the
+        same image are merged in a single entry.
+
+        Args:
+            digest: SHA256 of the image
+            event: image event returned by image_search
+            path: path of the downloaded image
+        """
+        image = self.images.setdefault(digest, {
+            'path': path,
+            'url': event.get('url'),
+            'targets': [],
+            'tags': [],
+        })
+        image['targets'].append(
+            '%s:%s' % (event.get('ip'), event.get('port')))
+        for word in tokenize(event.get('ocr', '')):
+            self.words.setdefault(word, set()).add(digest)
+        for tag in event.get('tags') or []:
+            if tag not in image['tags']:
+                image['tags'].append(tag)
+            self.tags.setdefault(tag.lower(), set()).add(digest)
+
+    def search(self, text: str = '', tags: Iterable[str] = ()) \
+            -> List[Dict[str, Any]]:
+        """
+        Find images containing all the words of text and having all tags
+
+        Returns:
+            the list of matching images
+        """
+        sets = [self.words.get(w, set()) for w in tokenize(text)]
+        sets += [self.tags.get(t.lower(), set()) for t in tags]
+        if not sets:
+            return []
+        digests = set.intersection(*sorted(sets, key=len))
+        return [dict(self.images[d], sha256=d) for d in sorted(digests)]
+
+    def save(self, path: str):
+        """
+        Save the index in a JSON file
+        """
+        with open(path, 'w') as f:
+            json.dump({
+                'images': self.images,
+                'words': {k: sorted(v) for k, v in self.words.items()},
+                'tags': {k: sorted(v) for k, v in self.tags.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'ImageIndex':
+        """
+        Load an index saved with save()
+        """
+        with open(path) as f:
+            data = json.load(f)
+        index = cls()
+        index.images = data['images']
+        index.words = {k: set(v) for k, v in data['words'].items()}
+        index.tags = {k: set(v) for k, v in data['tags'].items()}
+        return index
+
+
+class ImagePipeline(object):
+    """
+    Download the images of image_search results and index them
+
+    Args:
+        be: BinaryEdge client
+        directory: directory where images are stored, as SHA256.jpg
+        workers: number of concurrent downloads
+        max_pending: maximum number of downloads queued at once, which
+            bounds the memory used by events waiting to be downloaded
+        thumbnails: download thumbnails instead of full size images
+    """
+
+    def __init__(
+            self,
+            be: BinaryEdge,
+            directory: str,
+            workers: int = 8,
+            max_pending: int = 32,
+            thumbnails: bool = True):
+        self.be = be
+        self.directory = directory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.thumbnails = thumbnails
+        self.index = ImageIndex()
+        self.errors: List[Tuple[str, str]] = []
+        os.makedirs(directory, exist_ok=True)
+
+    def download(self, url: str) -> Tuple[str, str]:
+        """
+        Stream an image to disk while hashing it
+
+        Returns:
+            (SHA256, path) of the image
+
+        Raises:
+            BinaryEdgeException: if anything else than 200 is returned
+        """
+        r = self.be.requests.get(
+            url, stream=True, headers={'User-Agent': self.be.ua})
+        if r.status_code != 200:
+            r.close()
+            raise BinaryEdgeException('Invalid return code %i' % r.status_code)
+        sha = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f, r:
+                for chunk in r.iter_content(65536):
+                    sha.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        digest = sha.hexdigest()
+        path = os.path.join(self.directory, digest + '.jpg')
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, path)
+        return digest, path
+
+    def _collect(
+            self,
+            futures: Dict[Future, Tuple[str, Dict[str, Any]]],
+            block: bool):
+        done, _ = wait(
+            futures, return_when=FIRST_COMPLETED if block else ALL_COMPLETED)
+        for future in done:
+            url, event = futures.pop(future)
+            try:
+                digest, path = future.result()
+            except (BinaryEdgeException, requests.RequestException,
+                    OSError) as e:
+                self.errors.append((url, str(e)))
+                continue
+            self.index.add(digest, event, path)
+
+    def run(self, query: str, max_pages: int = 500) -> ImageIndex:
+        """
+        Download and index all the images of an image_search query
+
+        Args:
+            query: image search query
+            max_pages: maximum number of pages requested
+
+        Returns:
+            the index, also available as self.index. Failed downloads are
+            listed in self.errors as (url, error)
+        """
+        futures: Dict[Future, Tuple[str, Dict[str, Any]]] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for event in iter_image_events(self.be, query, max_pages):
+                url: Optional[str] = event.get(
+                    'thumb' if self.thumbnails else 'url') or event.get('url')
+                if not url:
+                    continue
+                futures[executor.submit(self.download, url)] = (url, event)
+                if len(futures) >= self.max_pending:
+                    self._collect(futures, True)
+            if futures:
+                self._collect(futures, False)
+        return self.index
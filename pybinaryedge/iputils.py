@@ -0,0 +1,130 @@
+"""
+    pybinaryedge.iputils
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Validation and normalization of IP addresses and CIDR ranges, for
+    single targets and for large batches of targets.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import ipaddress
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# Largest ranges produced when collapsing, per IP version: the API accepts
+# IPv4 CIDR up to /24, IPv6 ranges are limited to the same 256 addresses
+MAX_PREFIX = {4: 24, 6: 120}
+
+
+class ValidationResult(NamedTuple):
+    """
+    Result of validate_ips
+
+    Attributes:
+        valid: normalized and deduplicated IP addresses and CIDR ranges
+        invalid: list of (line number, line, reason) for invalid lines
+    """
+    valid: List[str]
+    invalid: List[Tuple[int, str, str]]
+
+
+def is_ipv4(ip: str) -> bool:
+    """
+    Fast check that a string is an IPv4 address in canonical dotted form,
+    without building an ipaddress object
+
+    Args:
+        ip: string to test
+
+    Returns:
+        True if the string is an IPv4 address
+    """
+    parts = ip.split('.')
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not part.isdigit() or not part.isascii():
+            return False
+        if len(part) > 1 and part[0] == '0':
+            return False
+        if int(part) > 255:
+            return False
+    return True
+
+
+def normalize_ip(ip: str) -> str:
+    """
+    Normalize an IPv4/IPv6 address or CIDR
+
+    Args:
+        ip: IP address or CIDR
+
+    Returns:
+        a string containing the normalized IP address or CIDR
+
+    Raises:
+        ValueError: if the string given is not a valid IP address or CIDR,
+            with the reason given by ipaddress
+    """
+    if is_ipv4(ip):
+        return ip
+    if '/' in ip:
+        return str(ipaddress.ip_network(ip, strict=False))
+    # Parsing with the right class gives a precise error message
+    if ':' in ip:
+        return str(ipaddress.IPv6Address(ip))
+    return str(ipaddress.IPv4Address(ip))
+
+
+def validate_ips(
+        lines: Iterable[str],
+        collapse: bool = False) -> ValidationResult:
+    """
+    Validate, normalize and deduplicate a batch of IP addresses and CIDR
+    ranges, one per line. Empty lines and comments starting with # are
+    ignored, and defanged addresses (1.2.3[.]4) are accepted.
+
+    Args:
+        lines: lines to be validated
+        collapse: merge addresses and ranges into the smallest list of
+            CIDR ranges covering them, split in ranges not larger than
+            MAX_PREFIX
+
+    Returns:
+        a ValidationResult with valid targets, in their input order unless
+        collapsed, and invalid lines with the reason of the failure
+    """
+    valid: Dict[str, None] = {}
+    invalid = []
+    for lineno, line in enumerate(lines, 1):
+        ip = line.strip().replace('[.]', '.')
+        if not ip or ip.startswith('#'):
+            continue
+        if ip in valid:
+            continue
+        try:
+            valid[normalize_ip(ip)] = None
+        except ValueError as e:
+            invalid.append((lineno, line.rstrip('\n'), str(e)))
+    if not collapse:
+        return ValidationResult(list(valid), invalid)
+    networks: Tuple[List[Network], List[Network]] = ([], [])
+    for ip in valid:
+        net = ipaddress.ip_network(ip)
+        networks[net.version == 6].append(net)
+    targets = []
+    for nets in networks:
+        for net in ipaddress.collapse_addresses(nets):  # type: ignore
+            if net.num_addresses == 1:
+                targets.append(str(net.network_address))
+            elif net.prefixlen < MAX_PREFIX[net.version]:
+                targets.extend(
+                    str(n) for n in net.subnets(
+                        new_prefix=MAX_PREFIX[net.version]))
+            else:
+                targets.append(str(net))
+    return ValidationResult(targets, invalid)
@@ -0,0 +1,63 @@
+"""
+    pybinaryedge.profiling
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Wall time breakdown per phase of the client and the CLI.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class Profiler(object):
+    """
+    Accumulates the wall time spent in named phases. Can be shared between
+    threads.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        """
+        Add seconds to the time spent in phase
+        """
+        with self._lock:
+            self.times[phase] = self.times.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Context manager recording the time spent in its block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> str:
+        """
+        Returns:
+            a table with the number of calls, total and mean time and share
+            of the total time of each phase
+        """
+        total = sum(self.times.values()) or 1.0
+        lines = ['%-14s %8s %10s %10s %6s' % (
+            'Phase', 'Calls', 'Total (s)', 'Mean (ms)', '%')]
+        for phase, seconds in self.times.items():
+            count = self.counts[phase]
+            lines.append('%-14s %8i %10.3f %10.3f %5.1f%%' % (
+                phase, count, seconds, seconds * 1000 / count,
+                seconds * 100 / total
+            ))
+        return '\n'.join(lines)
@@ -0,0 +1,301 @@
+"""
+    pybinaryedge.sensors
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Streaming aggregation of BinaryEdge sensor events: counters and top-k by
+    tag, port, ASN and country, and approximate count of distinct scanner
+    IPs, in bounded memory.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+from typing import (Any, Dict, Hashable, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+from .api import BinaryEdge
+
+# Path of each aggregated field in a sensor event, named after the types of
+# sensor_search_stats
+FIELDS: Dict[str, Tuple[str, ...]] = {
+    'ips': ('origin', 'ip'),
+    'ports': ('target', 'port'),
+    'tags': ('data', 'tags'),
+    'asn': ('origin', 'asn'),
+    'countries': ('origin', 'country'),
+}
+
+
+class SpaceSaving(object):
+    """
+    Approximate top-k counter keeping at most capacity keys (Space-Saving
+    algorithm). Counts of the most frequent keys are exact as long as there
+    are less distinct keys than capacity, and overestimated by at most
+    total / capacity otherwise.
+
+    Args:
+        capacity: maximum number of keys kept, None for exact counting
+    """
+
+    def __init__(self, capacity: Optional[int] = 1000):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.total = 0
+        # Min-heap of (count, sequence, key). Counts only grow, so entries
+        # are updated lazily when they reach the top of the heap
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._seq = itertools.count()
+
+    def add(self, key: Hashable, count: int = 1):
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+        elif self.capacity is None:
+            self.counts[key] = count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            heapq.heappush(self._heap, (count, next(self._seq), key))
+        else:
+            while True:
+                smallest, _, old = self._heap[0]
+                if self.counts[old] == smallest:
+                    break
+                heapq.heapreplace(
+                    self._heap, (self.counts[old], next(self._seq), old))
+            # Replace the least frequent key, inheriting its count
+            del self.counts[old]
+            self.counts[key] = smallest + count
+            heapq.heapreplace(
+                self._heap, (smallest + count, next(self._seq), key))
+
+    def top(self, k: int = 10) -> List[Tuple[Hashable, int]]:
+        """
+        Returns:
+            the k most frequent keys as a list of (key, count)
+        """
+        return sorted(
+            self.counts.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+class HyperLogLog(object):
+    """
+    Approximate count of distinct values using 2 ** precision bytes,
+    with a standard error of about 1.04 / sqrt(2 ** precision)
+
+    Args:
+        precision: number of bits used to select a register (4 to 16)
+    """
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 16:
+            raise ValueError('Invalid precision')
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, value: Any):
+        h = int.from_bytes(
+            hashlib.blake2b(str(value).encode(), digest_size=8).digest(),
+            'big'
+        )
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def __len__(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(
+            2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+def _lookup(event: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(event, dict):
+            return None
+        event = event.get(key)  # type: ignore
+    return event
+
+
+def stats_counts(stats: Any) -> Dict[Hashable, int]:
+    """
+    Convert a sensor_search_stats result to a dict of key -> count
+
+    Args:
+        stats: result of BinaryEdge.sensor_search_stats, either a list of
+            buckets ({'key': ..., 'doc_count': ...}) or a dict key -> count
+    """
+    if isinstance(stats, dict):
+        return dict(stats)
+    return {b['key']: b['doc_count'] for b in stats}
+
+
+class SensorAggregator(object):
+    """
+    Incremental aggregation of sensor events. Events can be added one by
+    one or page by page, memory use only depends on capacity and precision.
+
+    Args:
+        capacity: maximum number of keys kept per field, None for exact
+            counts
+        precision: precision of the distinct IPs estimator
+        fields: names and paths of the fields aggregated (default FIELDS)
+    """
+
+    def __init__(
+            self,
+            capacity: Optional[int] = 1000,
+            precision: int = 14,
+            fields: Optional[Dict[str, Tuple[str, ...]]] = None):
+        self.fields = fields or FIELDS
+        self.counters = {f: SpaceSaving(capacity) for f in self.fields}
+        self.ips = HyperLogLog(precision)
+        self.events = 0
+
+    def add(self, event: Dict[str, Any]):
+        """
+        Add a sensor event
+        """
+        self.events += 1
+        for name, path in self.fields.items():
+            value = _lookup(event, path)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                for v in value:
+                    self.counters[name].add(v)
+            else:
+                self.counters[name].add(value)
+                if name == 'ips':
+                    self.ips.add(value)
+
+    def add_page(self, page: Dict[str, Any]):
+        """
+        Add all the events of a sensor_search result
+        """
+        for event in page.get('events', []):
+            self.add(event)
+
+    def consume(self, pages: Iterable[Dict[str, Any]]):
+        """
+        Add all the events of an iterable of sensor_search results
+        """
+        for page in pages:
+            self.add_page(page)
+
+    def top(self, field: str, k: int = 10) -> List[Tuple[Hashable, int]]:
+        """
+        Returns:
+            the k most frequent values of field as a list of (value, count)
+        """
+        return self.counters[field].top(k)
+
+    def distinct_ips(self) -> int:
+        """
+        Returns:
+            the estimated number of distinct scanner IPs
+        """
+        return len(self.ips)
+
+    def compare(self, field: str, stats: Any, k: int = 10) \
+            -> List[Tuple[Hashable, int, int]]:
+        """
+        Compare local counts with the sensor_search_stats result for the
+        same field
+
+        Returns:
+            a list of (value, local count, server count) for the k most
+            frequent values on the server
+        """
+        server = stats_counts(stats)
+        counts = self.counters[field].counts
+        top = sorted(server.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(key, counts.get(key, 0), count) for key, count in top]
+
+    def report(self, k: int = 10) -> Dict[str, Any]:
+        """
+        Returns:
+            a dict with the number of events, the estimated number of
+            distinct IPs and the top k values of each field
+        """
+        report: Dict[str, Any] = {
+            'events': self.events,
+            'distinct_ips': self.distinct_ips()
+        }
+        for field in self.fields:
+            report[field] = self.top(field, k)
+        return report
+
+
+def iter_sensor_pages(
+        be: BinaryEdge,
+        query: str,
+        max_pages: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the pages of a sensor_search query, one request at a time
+
+    Args:
+        be: BinaryEdge client
+        query: sensor search query
+        max_pages: maximum number of pages requested (500 is the API limit)
+    """
+    for page in range(1, max_pages + 1):
+        res = be.sensor_search(query, page=page)
+        events = res.get('events', [])
+        if not events:
+            return
+        yield res
+        if page * res.get('pagesize', len(events)) >= res.get('total', 0):
+            return
+
+
+def sensor_report(
+        be: BinaryEdge,
+        query: str,
+        fields: Iterable[str] = ('tags', 'ports', 'asn', 'countries'),
+        days: int = 60,
+        k: int = 10,
+        use_stats: bool = True,
+        max_pages: int = 500) -> Dict[str, Any]:
+    """
+    Top k values of each field for a sensor query. If use_stats is True,
+    the counts are taken from sensor_search_stats, which avoids downloading
+    the events, otherwise the events are downloaded and aggregated.
+
+    Args:
+        be: BinaryEdge client
+        query: sensor search query
+        fields: fields reported, among the keys of FIELDS
+        days: number of days of stats when use_stats is True
+        k: number of values reported per field
+        use_stats: use server-side statistics
+        max_pages: maximum number of event pages downloaded
+
+    Returns:
+        a dict field -> list of (value, count)
+    """
+    fields = list(fields)
+    for field in fields:
+        if field not in FIELDS:
+            raise ValueError('Invalid field %s' % field)
+    if use_stats:
+        report = {}
+        for field in fields:
+            counts = stats_counts(be.sensor_search_stats(query, field, days))
+            report[field] = sorted(
+                counts.items(), key=lambda x: x[1], reverse=True)[:k]
+        return report
+    agg = SensorAggregator(fields={f: FIELDS[f] for f in fields})
+    agg.consume(iter_sensor_pages(be, query, max_pages))
+    return {field: agg.top(field, k) for field in fields}
@@ -0,0 +1,114 @@
+"""
+    pybinaryedge.storage
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Read and write BinaryEdge results as NDJSON files (one JSON document
+    per line), compressed according to the file extension:
+    * .gz: gzip
+    * .xz: lzma
+    * .zst: zstandard (requires the zstandard package)
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import gzip
+import io
+import json
+import lzma
+from types import ModuleType
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, cast
+
+zstandard: Optional[ModuleType]
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_EXTENSIONS = ('.gz', '.xz', '.zst')
+
+
+def is_compressed(path: str) -> bool:
+    """
+    Returns:
+        True if the file is compressed according to its extension
+    """
+    return path.endswith(COMPRESSED_EXTENSIONS)
+
+
+def open_ndjson(path: str, mode: str = 'r') -> IO[str]:
+    """
+    Open a NDJSON file in text mode, compressed based on its extension.
+    Compressed files can be appended to, each append adding a new
+    gzip member, xz stream or zstd frame.
+
+    Args:
+        path: path of the file
+        mode: 'r' to read, 'w' to write or 'a' to append
+
+    Returns:
+        a file object
+
+    Raises:
+        ValueError: if mode is invalid or zstandard is not installed
+    """
+    if mode not in ('r', 'w', 'a'):
+        raise ValueError('Invalid mode %s' % mode)
+    if path.endswith('.gz'):
+        return cast(IO[str], gzip.open(path, mode + 't', encoding='utf-8'))
+    if path.endswith('.xz'):
+        return cast(IO[str], lzma.open(path, mode + 't', encoding='utf-8'))
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError('zstandard is required for .zst files')
+        f = open(path, mode + 'b')
+        stream: Any
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                f, closefd=True, read_across_frames=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(
+                f, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def write_ndjson(
+        path: str,
+        records: Iterable[Dict[str, Any]],
+        append: bool = True) -> int:
+    """
+    Write records in a NDJSON file
+
+    Args:
+        path: path of the file, compressed based on its extension
+        records: dicts to be written, one per line
+        append: append to the file instead of overwriting it
+
+    Returns:
+        the number of records written
+    """
+    count = 0
+    with open_ndjson(path, 'a' if append else 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+            count += 1
+    return count
+
+
+def read_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records back from a NDJSON file, without loading the whole
+    file in memory
+
+    Args:
+        path: path of the file, compressed based on its extension
+
+    Returns:
+        an iterator over the records
+    """
+    with open_ndjson(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,238 @@
+"""
+    pybinaryedge.timeline
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Compaction of host_historical and torrent_historical_ip results into
+    intervals of time during which the same (port, service, product,
+    version) was observed, with a compact serialized form.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple)
+
+# (port, service, product, version)
+Key = Tuple[Any, Any, Any, Any]
+
+# One week, BinaryEdge timestamps are in milliseconds
+DEFAULT_GAP = 7 * 24 * 3600 * 1000
+
+
+def host_key(result: Dict[str, Any]) -> Optional[Tuple[int, Key]]:
+    """
+    Extract the timestamp and the key of a host_historical result
+    """
+    ts = (result.get('origin') or {}).get('ts')
+    if ts is None:
+        return None
+    data = (result.get('result') or {}).get('data') or {}
+    service = data.get('service') or {}
+    return ts, (
+        (result.get('target') or {}).get('port'),
+        service.get('name'),
+        service.get('product'),
+        service.get('version'),
+    )
+
+
+def torrent_key(result: Dict[str, Any]) -> Optional[Tuple[int, Key]]:
+    """
+    Extract the timestamp and the key of a torrent_historical_ip result,
+    the torrent name and infohash are used as product and version
+    """
+    ts = (result.get('origin') or {}).get('ts')
+    if ts is None:
+        return None
+    torrent = result.get('torrent') or {}
+    return ts, (
+        (result.get('peer') or {}).get('port'),
+        'torrent',
+        torrent.get('name'),
+        torrent.get('infohash'),
+    )
+
+
+def iter_results(res: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the results of a historical response, whether events are
+    grouped by port (with a results list) or not
+    """
+    for event in res.get('events', []):
+        if 'results' in event:
+            yield from event['results']
+        else:
+            yield event
+
+
+class Timeline(object):
+    """
+    Intervals of observation of each key, built in a single pass over the
+    results. Two observations of the same key less than gap apart are
+    merged in the same interval.
+
+    Args:
+        gap: maximum time between two observations of an interval, in the
+            unit of the timestamps (milliseconds for BinaryEdge)
+    """
+
+    def __init__(self, gap: int = DEFAULT_GAP):
+        self.gap = gap
+        # key -> list of [first, last, count]
+        self.intervals: Dict[Key, List[List[int]]] = {}
+
+    def add(self, ts: int, key: Key):
+        """
+        Add an observation of key at ts
+        """
+        intervals = self.intervals.setdefault(key, [])
+        # Results are mostly sorted, so the last interval usually matches
+        for interval in reversed(intervals):
+            if interval[0] - self.gap <= ts <= interval[1] + self.gap:
+                interval[0] = min(interval[0], ts)
+                interval[1] = max(interval[1], ts)
+                interval[2] += 1
+                return
+        intervals.append([ts, ts, 1])
+
+    def consume(
+            self,
+            res: Dict[str, Any],
+            key: Callable[[Dict[str, Any]], Optional[Tuple[int, Key]]]
+            = host_key) -> 'Timeline':
+        """
+        Add all the results of a historical response
+
+        Args:
+            res: result of host_historical or torrent_historical_ip
+            key: function extracting (timestamp, key) from a result,
+                host_key or torrent_key
+        """
+        for result in iter_results(res):
+            obs = key(result)
+            if obs is not None:
+                self.add(*obs)
+        self._merge()
+        return self
+
+    def _merge(self):
+        # Results given out of order can leave intervals overlapping
+        for key, intervals in self.intervals.items():
+            intervals.sort()
+            merged = [intervals[0]]
+            for interval in intervals[1:]:
+                last = merged[-1]
+                if interval[0] <= last[1] + self.gap:
+                    last[1] = max(last[1], interval[1])
+                    last[2] += interval[2]
+                else:
+                    merged.append(interval)
+            self.intervals[key] = merged
+
+    def keys(self) -> List[Key]:
+        """
+        Returns:
+            the keys observed, as (port, service, product, version)
+        """
+        return list(self.intervals)
+
+    def first_seen(self, key: Key) -> int:
+        """
+        Returns:
+            the timestamp of the first observation of key
+
+        Raises:
+            KeyError: if key was never observed
+        """
+        return self.intervals[key][0][0]
+
+    def last_seen(self, key: Key) -> int:
+        """
+        Returns:
+            the timestamp of the last observation of key
+
+        Raises:
+            KeyError: if key was never observed
+        """
+        return self.intervals[key][-1][1]
+
+    def seen_at(self, ts: int) -> List[Key]:
+        """
+        Returns:
+            the keys observed in an interval including ts
+        """
+        return [
+            key for key, intervals in self.intervals.items()
+            if any(i[0] <= ts <= i[1] for i in intervals)
+        ]
+
+    def diff(self, other: 'Timeline') -> Dict[str, List[Key]]:
+        """
+        Compare the keys observed in two timelines
+
+        Returns:
+            a dict with keys only in this timeline ('removed') and keys only
+            in other ('added')
+        """
+        return {
+            'removed': [k for k in self.intervals if k not in other.intervals],
+            'added': [k for k in other.intervals if k not in self.intervals],
+        }
+
+    def to_compact(self) -> Dict[str, Any]:
+        """
+        Serialize the timeline as a JSON compatible dict, with each key
+        stored once and intervals as lists of integers
+
+        Returns:
+            {'gap': gap, 'keys': [key, ...],
+            'intervals': [[key index, first, last, count], ...]}
+        """
+        keys = list(self.intervals)
+        return {
+            'gap': self.gap,
+            'keys': [list(k) for k in keys],
+            'intervals': [
+                [index] + interval
+                for index, k in enumerate(keys)
+                for interval in self.intervals[k]
+            ],
+        }
+
+    @classmethod
+    def from_compact(cls, data: Dict[str, Any]) -> 'Timeline':
+        """
+        Load a timeline serialized with to_compact
+        """
+        timeline = cls(data['gap'])
+        keys = [tuple(k) for k in data['keys']]
+        for index, first, last, count in data['intervals']:
+            timeline.intervals.setdefault(
+                keys[index], []).append([first, last, count])  # type: ignore
+        return timeline
+
+
+def compact_many(
+        results: Iterable[Tuple[str, Dict[str, Any]]],
+        key: Callable[[Dict[str, Any]], Optional[Tuple[int, Key]]]
+        = host_key,
+        gap: int = DEFAULT_GAP) -> Iterator[Dict[str, Any]]:
+    """
+    Compact historical responses of many hosts, one at a time, to be
+    written with pybinaryedge.storage.write_ndjson
+
+    Args:
+        results: iterable of (ip, historical response)
+        key: host_key or torrent_key
+        gap: maximum time between two observations of an interval
+
+    Returns:
+        an iterator over dicts {'ip': ip, 'timeline': compact timeline}
+    """
+    for ip, res in results:
+        yield {
+            'ip': ip,
+            'timeline': Timeline(gap).consume(res, key).to_compact()
+        }
@@ -0,0 +1,478 @@
+"""
+    pybinaryedge.workqueue
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Work queue running BinaryEdge requests for very large target lists
+    over a pool of processes, and optionally over several machines sharing
+    the same queue.
+
+    :copyright: Tek
+    :license: MIT Licence
+
+"""
+
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+
+from .api import BinaryEdge, BinaryEdgeException, BinaryEdgeNotFound
+from .iputils import validate_ips
+from .storage import is_compressed, open_ndjson
+
+# Methods of BinaryEdge taking a single target as argument
+METHODS = [
+    'host', 'host_historical', 'host_score', 'host_vulnerabilities',
+    'image_ip', 'torrent_ip', 'torrent_historical_ip', 'domain_ip',
+    'domain_dns', 'domain_subdomains', 'sensor_ip', 'dataleaks_email',
+    'dataleaks_organization'
+]
+
+# Methods taking an IP address or a CIDR
+IP_METHODS = [
+    'host', 'host_historical', 'host_score', 'host_vulnerabilities',
+    'image_ip', 'torrent_ip', 'torrent_historical_ip', 'domain_ip'
+]
+
+PENDING = 0
+LEASED = 1
+DONE = 2
+FAILED = 3
+
+
+class IncompleteRun(BinaryEdgeException):
+    """
+    Exception raised by run() if targets are still not processed when its
+    timeout expires. The queue and the results obtained so far are kept,
+    calling run() again with the same output finishes the job.
+    """
+
+    def __init__(self, pending: int):
+        self.pending = pending
+        BinaryEdgeException.__init__(
+            self, '%i targets not processed yet' % pending)
+
+
+class QueueBackend(ABC):
+    """
+    Interface of a work queue backend. A backend stores targets, leases
+    them to workers and forgets them once they are acknowledged. Targets
+    whose lease expires before being acknowledged are delivered again, so
+    every target is processed at least once.
+    """
+
+    @abstractmethod
+    def put(self, targets: Iterable[str]) -> int:
+        """
+        Add targets to the queue, ignoring targets already queued
+
+        Returns:
+            the number of targets added
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, count: int) -> List[Tuple[int, str]]:
+        """
+        Lease up to count targets
+
+        Returns:
+            a list of (task id, target)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def renew(self, task_ids: List[int]):
+        """
+        Extend the lease of tasks still being processed
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def ack(self, task_id: int):
+        """
+        Mark a task as processed
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, task_id: int, max_attempts: int, delay: float = 0) \
+            -> bool:
+        """
+        Give a task back to the queue after an error
+
+        Args:
+            task_id: id of the task
+            max_attempts: number of tries before abandoning the task
+            delay: number of seconds before the first retry of the task,
+                doubled at each attempt
+
+        Returns:
+            False if the task reached max_attempts and was abandoned
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def throttle(self, interval: float):
+        """
+        Block until the caller is allowed to send a request, so that all
+        workers sharing the queue send at most one request every interval
+        seconds
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def pending(self) -> int:
+        """
+        Returns:
+            the number of targets not processed yet
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def next_available(self) -> Optional[float]:
+        """
+        Returns:
+            the earliest time at which a target not processed yet can be
+            claimed (a past time if one can be claimed now), or None if
+            all targets are processed
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        """
+        Release the resources used by the backend
+        """
+        raise NotImplementedError
+
+
+class SQLiteQueue(QueueBackend):
+    """
+    Work queue stored in a SQLite database. The database can be shared by
+    several processes, or several machines through a shared filesystem
+    supporting locks.
+
+    Args:
+        path: path of the SQLite database
+        lease: number of seconds after which a leased task not acknowledged
+            is delivered again
+    """
+
+    def __init__(self, path: str, lease: float = 300):
+        self.path = path
+        self.lease = lease
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'id INTEGER PRIMARY KEY, target TEXT UNIQUE, '
+            'state INTEGER DEFAULT 0, lease_until REAL DEFAULT 0, '
+            'attempts INTEGER DEFAULT 0)'
+        )
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS tasks_state '
+            'ON tasks (state, lease_until)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS ratelimit (next_slot REAL)'
+        )
+
+    def put(self, targets: Iterable[str]) -> int:
+        cur = self.db.execute('BEGIN IMMEDIATE')
+        before = self.db.total_changes
+        cur.executemany(
+            'INSERT OR IGNORE INTO tasks (target) VALUES (?)',
+            ((t,) for t in targets)
+        )
+        self.db.execute('COMMIT')
+        return self.db.total_changes - before
+
+    def claim(self, count: int) -> List[Tuple[int, str]]:
+        now = time.time()
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            # Pending tasks have a lease_until too when retried after a delay
+            rows = self.db.execute(
+                'SELECT id, target FROM tasks WHERE state IN (?, ?) AND '
+                'lease_until <= ? LIMIT ?',
+                (PENDING, LEASED, now, count)
+            ).fetchall()
+            self.db.executemany(
+                'UPDATE tasks SET state = ?, lease_until = ? WHERE id = ?',
+                ((LEASED, now + self.lease, r[0]) for r in rows)
+            )
+            self.db.execute('COMMIT')
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+        return rows
+
+    def renew(self, task_ids: List[int]):
+        self.db.executemany(
+            'UPDATE tasks SET lease_until = ? WHERE id = ? AND state = ?',
+            ((time.time() + self.lease, i, LEASED) for i in task_ids)
+        )
+
+    def ack(self, task_id: int):
+        self.db.execute(
+            'UPDATE tasks SET state = ? WHERE id = ?', (DONE, task_id)
+        )
+
+    def fail(self, task_id: int, max_attempts: int, delay: float = 0) \
+            -> bool:
+        self.db.execute(
+            'UPDATE tasks SET attempts = attempts + 1, '
+            'lease_until = ? + ? * (1 << attempts), '
+            'state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END '
+            'WHERE id = ?',
+            (time.time(), delay, max_attempts, FAILED, PENDING, task_id)
+        )
+        row = self.db.execute(
+            'SELECT state FROM tasks WHERE id = ?', (task_id,)
+        ).fetchone()
+        return row[0] != FAILED
+
+    def throttle(self, interval: float):
+        if interval <= 0:
+            return
+        self.db.execute('BEGIN IMMEDIATE')
+        row = self.db.execute('SELECT next_slot FROM ratelimit').fetchone()
+        now = time.time()
+        slot = max(now, row[0]) if row else now
+        if row:
+            self.db.execute(
+                'UPDATE ratelimit SET next_slot = ?', (slot + interval,)
+            )
+        else:
+            self.db.execute(
+                'INSERT INTO ratelimit VALUES (?)', (slot + interval,)
+            )
+        self.db.execute('COMMIT')
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pending(self) -> int:
+        return self.db.execute(
+            'SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)',
+            (PENDING, LEASED)
+        ).fetchone()[0]
+
+    def next_available(self) -> Optional[float]:
+        return self.db.execute(
+            'SELECT MIN(lease_until) FROM tasks WHERE state IN (?, ?)',
+            (PENDING, LEASED)
+        ).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+QueueFactory = Union[str, Callable[[], QueueBackend]]
+
+
+def open_queue(queue: QueueFactory) -> QueueBackend:
+    """
+    Open a work queue
+
+    Args:
+        queue: path of a SQLite queue, or a callable returning a backend.
+            The callable is called in each worker process, so it has to be
+            picklable (a module-level function or a functools.partial)
+    """
+    if isinstance(queue, str):
+        return SQLiteQueue(queue)
+    return queue()
+
+
+def worker(
+        key: str,
+        queue: QueueFactory,
+        output: str,
+        method: str = 'host',
+        rate: Optional[float] = None,
+        verify: bool = True,
+        batch: int = 100,
+        max_attempts: int = 3,
+        retry_delay: float = 10) -> int:
+    """
+    Process targets from a queue until none can be claimed, writing one
+    JSON line per target in output. Can be run on other machines sharing
+    the queue. Targets leased by other workers, or waiting to be retried,
+    are left in the queue (see run()).
+
+    Args:
+        key: The BinaryEdge API key
+        queue: path of the SQLite queue, or a callable returning a
+            QueueBackend (see open_queue)
+        output: NDJSON file where results are appended. It can not be
+            compressed, as compressed streams cut by a crash are not
+            readable
+        method: name of the BinaryEdge method called for each target
+        rate: maximum number of requests per second for all the workers
+        verify: Enable or disable SSL verification
+        batch: number of targets leased at once
+        max_attempts: number of tries before giving up on a target after
+            network errors or error codes
+        retry_delay: number of seconds before the first retry of a target,
+            doubled at each attempt
+
+    Returns:
+        the number of targets processed
+
+    Raises:
+        ValueError: if method is invalid or output is compressed
+    """
+    if method not in METHODS:
+        raise ValueError('Invalid method %s' % method)
+    if is_compressed(output):
+        raise ValueError('Worker output can not be compressed')
+    be = BinaryEdge(key, verify)
+    backend = open_queue(queue)
+    call = getattr(be, method)
+    interval = 1.0 / rate if rate else 0
+    done = 0
+    try:
+        with open(output, 'a') as f:
+            while True:
+                tasks = backend.claim(batch)
+                if not tasks:
+                    break
+                for i, (task_id, target) in enumerate(tasks):
+                    backend.throttle(interval)
+                    # Waiting for the rate limit can outlast the lease of
+                    # the batch, keep it leased to avoid duplicate requests
+                    backend.renew([t[0] for t in tasks[i:]])
+                    line: Dict[str, Any] = {'target': target}
+                    try:
+                        line['result'] = call(target)
+                    except BinaryEdgeNotFound as e:
+                        line['error'] = e.message
+                    except ValueError as e:
+                        # Invalid targets fail the same way every time
+                        line['error'] = str(e)
+                    except (BinaryEdgeException,
+                            requests.RequestException) as e:
+                        if backend.fail(task_id, max_attempts, retry_delay):
+                            continue
+                        line['error'] = str(e)
+                    # Results are on disk before the task is acknowledged
+                    f.write(json.dumps(line) + '\n')
+                    f.flush()
+                    backend.ack(task_id)
+                    done += 1
+    finally:
+        backend.close()
+    return done
+
+
+def merge_ndjson(parts: List[str], output: str) -> int:
+    """
+    Merge uncompressed NDJSON files produced by workers, dropping duplicate
+    targets delivered more than once. output is compressed based on its
+    extension (see pybinaryedge.storage)
+
+    Returns:
+        the number of lines written
+    """
+    seen = set()
+    count = 0
+    with open_ndjson(output, 'w') as out:
+        for part in parts:
+            with open(part) as f:
+                for line in f:
+                    target = json.loads(line)['target']
+                    if target in seen:
+                        continue
+                    seen.add(target)
+                    out.write(line)
+                    count += 1
+    return count
+
+
+def run(
+        key: str,
+        targets: Iterable[str],
+        output: str,
+        method: str = 'host',
+        processes: Optional[int] = None,
+        queue: Optional[QueueFactory] = None,
+        rate: Optional[float] = None,
+        verify: bool = True,
+        validate: bool = True,
+        timeout: Optional[float] = None) -> int:
+    """
+    Queue targets and process them with a pool of worker processes, then
+    merge the results in a single NDJSON file. Workers are started again
+    until every target is processed, waiting for the leases of crashed or
+    remote workers to expire and for failed targets to be retried.
+
+    Args:
+        key: The BinaryEdge API key
+        targets: list of targets (IP addresses, domains or emails)
+        output: path of the merged NDJSON file, compressed if it ends with
+            .gz, .xz or .zst
+        method: name of the BinaryEdge method called for each target
+        processes: number of worker processes (default is the CPU count)
+        queue: path of the SQLite queue (default is output + '.queue'),
+            removed once all its targets are processed, or a callable
+            returning a QueueBackend (see open_queue)
+        rate: maximum number of requests per second for all the workers
+        verify: Enable or disable SSL verification
+        validate: for methods taking an IP address, normalize and
+            deduplicate targets and skip invalid ones before queuing them
+            (see pybinaryedge.iputils.validate_ips)
+        timeout: maximum number of seconds to wait for targets leased by
+            other workers or waiting to be retried, None to wait until
+            all targets are processed
+
+    Returns:
+        the number of lines written in output
+
+    Raises:
+        IncompleteRun: if targets are still not processed after timeout
+    """
+    if method not in METHODS:
+        raise ValueError('Invalid method %s' % method)
+    if validate and method in IP_METHODS:
+        targets = validate_ips(targets).valid
+    processes = processes or os.cpu_count() or 1
+    queue = queue or output + '.queue'
+    deadline = time.time() + timeout if timeout is not None else None
+    backend = open_queue(queue)
+    backend.put(targets)
+    parts = ['%s.part%i' % (output, i) for i in range(processes)]
+    try:
+        while True:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [
+                    executor.submit(
+                        worker, key, queue, part, method, rate, verify
+                    ) for part in parts
+                ]
+                for future in futures:
+                    future.result()
+            available = backend.next_available()
+            if available is None:
+                break
+            if deadline is not None and available > deadline:
+                break
+            time.sleep(max(0, available - time.time()))
+        pending = backend.pending()
+    finally:
+        backend.close()
+    if pending:
+        # Targets marked as done would be ignored by the next run, keep
+        # their results in the parts to merge them with the next ones
+        raise IncompleteRun(pending)
+    count = merge_ndjson([p for p in parts if os.path.exists(p)], output)
+    for part in parts:
+        if os.path.exists(part):
+            os.remove(part)
+    if isinstance(queue, str):
+        os.remove(queue)
+    return count
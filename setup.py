@@ -14,6 +14,10 @@ setup(
     author_email='tek@randhome.io',
     keywords='osint',
     install_requires=['requests', 'configparser'],
+    extras_require={
+        'compression': ['urllib3[brotli,zstd]'],
+        'zstd': ['zstandard']
+    },
     license='MIT',
     packages=['pybinaryedge'],
     entry_points={
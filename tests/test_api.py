@@ -0,0 +1,131 @@
+import unittest
+
+from pybinaryedge.api import BinaryEdge, BinaryEdgeException
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+        self.content = b''
+
+    def json(self):
+        return self.data
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, stream=False):
+        self.calls.append((url, params))
+        if params and params.get('query') == 'fail':
+            return FakeResponse(500)
+        return FakeResponse(200, {'url': url, 'params': params})
+
+
+class ScriptedSession(object):
+    """
+    Session returning the given responses in order, and keeping the
+    headers of each request
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.headers = []
+
+    def get(self, url, params=None, headers=None, stream=False):
+        self.headers.append(headers)
+        return self.responses.pop(0)
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.be = BinaryEdge('key', cache_ttl=60, cache_size=2)
+        self.be.requests = FakeSession()
+
+    def test_cache_hit(self):
+        self.be.host('1.1.1.1')
+        self.be.host('1.1.1.1')
+        self.assertEqual(len(self.be.requests.calls), 1)
+
+    def test_cache_size(self):
+        self.be.host('1.1.1.1')
+        self.be.host('2.2.2.2')
+        self.be.host('1.1.1.1')
+        self.be.host('3.3.3.3')
+        self.assertEqual(len(self.be._cache), 2)
+        # 2.2.2.2 was the least recently used
+        self.be.host('1.1.1.1')
+        self.assertEqual(len(self.be.requests.calls), 3)
+        self.be.host('2.2.2.2')
+        self.assertEqual(len(self.be.requests.calls), 4)
+
+
+class TestConditionalRequests(unittest.TestCase):
+    def setUp(self):
+        self.be = BinaryEdge('key', cache_ttl=60)
+
+    def expire(self):
+        for key, entry in self.be._cache.items():
+            self.be._cache[key] = entry._replace(ts=entry.ts - 3600)
+
+    def test_not_modified(self):
+        self.be.requests = ScriptedSession(
+            FakeResponse(200, {'ip': '1.1.1.1'}, {
+                'ETag': '"v1"',
+                'Last-Modified': 'Mon, 19 Oct 2026 10:00:00 GMT'}),
+            FakeResponse(304, headers={'Cache-Control': 'max-age=600'}))
+        self.be.host('1.1.1.1')
+        self.expire()
+        self.assertEqual(self.be.host('1.1.1.1'), {'ip': '1.1.1.1'})
+        headers = self.be.requests.headers[1]
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertEqual(
+            headers['If-Modified-Since'], 'Mon, 19 Oct 2026 10:00:00 GMT')
+        # The max-age of the 304 response replaces the default ttl
+        entry = next(iter(self.be._cache.values()))
+        self.assertEqual(entry.ttl, 600)
+        self.assertEqual(self.be.host('1.1.1.1'), {'ip': '1.1.1.1'})
+        self.assertEqual(len(self.be.requests.headers), 2)
+
+    def test_no_cache(self):
+        self.be.requests = ScriptedSession(
+            FakeResponse(
+                200, {'ip': '1.1.1.1'},
+                {'ETag': '"v1"', 'Cache-Control': 'no-cache'}),
+            FakeResponse(304),
+            FakeResponse(304))
+        self.be.host('1.1.1.1')
+        self.assertEqual(self.be.host('1.1.1.1'), {'ip': '1.1.1.1'})
+        self.assertEqual(self.be.host('1.1.1.1'), {'ip': '1.1.1.1'})
+        self.assertEqual(len(self.be.requests.headers), 3)
+        self.assertEqual(self.be.requests.headers[2]['If-None-Match'], '"v1"')
+
+    def test_no_store(self):
+        self.be.requests = ScriptedSession(
+            FakeResponse(200, {'ip': '1.1.1.1'}, {
+                'ETag': '"v1"', 'Cache-Control': 'no-store'}),
+            FakeResponse(200, {'ip': '1.1.1.1'}))
+        self.be.host('1.1.1.1')
+        self.be.host('1.1.1.1')
+        self.assertNotIn('If-None-Match', self.be.requests.headers[1])
+
+
+class TestStatsSweep(unittest.TestCase):
+    def test_errors(self):
+        be = BinaryEdge('key')
+        be.requests = FakeSession()
+        res = be.stats_sweep(['ok', 'fail'], ['ports', 'asn'])
+        self.assertEqual(res['ok']['ports']['params']['type'], 'ports')
+        self.assertIsInstance(res['fail']['asn'], BinaryEdgeException)
+        self.assertEqual(len(be.requests.calls), 4)
+
+    def test_invalid_type(self):
+        with self.assertRaises(BinaryEdgeException):
+            BinaryEdge('key').stats_sweep(['ok'], ['invalid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pybinaryedge.api import BinaryEdgeException, BinaryEdgeNotFound
+from pybinaryedge.dataleaks import (DataleaksChecker, NegativeCache,
+                                    normalize_email)
+
+
+class FakeBinaryEdge(object):
+    def __init__(self):
+        self.calls = []
+
+    def dataleaks_email(self, email):
+        self.calls.append(email)
+        if email.startswith('unknown'):
+            raise BinaryEdgeNotFound()
+        if email.startswith('limited'):
+            raise BinaryEdgeException('Invalid return code 429')
+        return {'total': 1, 'events': [{'leak': 'leak1'}]}
+
+    def dataleaks_organization(self, domain):
+        return {'total': 42}
+
+    def dataleaks_info(self):
+        return {'events': [{'leak': 'leak1', 'count': 1000}]}
+
+
+class TestDataleaks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.tmp.name, 'cache.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email(' John+x@Example.COM\n'),
+                         'john@example.com')
+        with self.assertRaises(ValueError):
+            normalize_email('example.com')
+
+    def test_summary(self):
+        be = FakeBinaryEdge()
+        checker = DataleaksChecker(be, cache=NegativeCache(self.cache))
+        summary = checker.summary([
+            'a+1@foo.com\n', 'A@foo.com\n', 'unknown@foo.com\n',
+            'limited@bar.org\n', 'invalid\n', '\n'
+        ])
+        self.assertEqual(sorted(be.calls), [
+            'a@foo.com', 'limited@bar.org', 'unknown@foo.com'])
+        self.assertEqual(summary['foo.com']['checked'], 2)
+        self.assertEqual(summary['foo.com']['exposed'], 1)
+        self.assertEqual(summary['foo.com']['leaks']['leak1']['count'], 1)
+        self.assertEqual(summary['bar.org']['errors'], 1)
+        self.assertEqual(summary['bar.org']['organization'], {'total': 42})
+        self.assertEqual(checker.invalid[0][:2], (5, 'invalid'))
+        self.assertEqual(checker.errors[0][0], 'limited@bar.org')
+        with open(self.cache) as f:
+            self.assertEqual(len(json.load(f)), 1)
+
+    def test_negative_cache(self):
+        be = FakeBinaryEdge()
+        DataleaksChecker(be, cache=NegativeCache(self.cache)).check_emails(
+            ['unknown@foo.com'])
+        DataleaksChecker(be, cache=NegativeCache(self.cache)).check_emails(
+            ['unknown@foo.com'])
+        self.assertEqual(be.calls, ['unknown@foo.com'])
+
+
+if __name__ == '__main__':
+    unittest.main()
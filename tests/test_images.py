@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+import requests
+
+from pybinaryedge.api import BinaryEdge
+from pybinaryedge.images import ImageIndex, ImagePipeline
+
+
+class FakeResponse(object):
+    status_code = 200
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeSession(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, url, stream=False, headers=None):
+        return FakeResponse(self.chunks)
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.be = BinaryEdge('key')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_download(self):
+        self.be.requests = FakeSession([b'ab', b'cd'])
+        pipeline = ImagePipeline(self.be, self.tmp.name)
+        digest, path = pipeline.download('http://image')
+        pipeline.download('http://image')
+        self.assertEqual(os.listdir(self.tmp.name), [digest + '.jpg'])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'abcd')
+
+    def test_download_error(self):
+        self.be.requests = FakeSession(
+            [b'ab', requests.exceptions.ChunkedEncodingError('reset')])
+        pipeline = ImagePipeline(self.be, self.tmp.name)
+        with self.assertRaises(requests.RequestException):
+            pipeline.download('http://image')
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class TestImageIndex(unittest.TestCase):
+    def test_duplicate_digest(self):
+        index = ImageIndex()
+        index.add('sha', {
+            'ip': '1.1.1.1', 'port': 80, 'ocr': 'Login page',
+            'tags': ['Login']}, 'sha.jpg')
+        index.add('sha', {
+            'ip': '2.2.2.2', 'port': 8080, 'ocr': ['Admin console'],
+            'tags': ['Login', 'Admin']}, 'sha.jpg')
+        self.assertEqual(len(index.images), 1)
+        self.assertEqual(
+            index.images['sha']['targets'], ['1.1.1.1:80', '2.2.2.2:8080'])
+        self.assertEqual(index.images['sha']['tags'], ['Login', 'Admin'])
+        self.assertEqual(len(index.search('admin console')), 1)
+        self.assertEqual(len(index.search('login', tags=['admin'])), 1)
+        self.assertEqual(index.search('unknown'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from pybinaryedge.iputils import is_ipv4, normalize_ip, validate_ips
+
+
+class TestIsIPv4(unittest.TestCase):
+    def test_valid(self):
+        for ip in ['0.0.0.0', '1.2.3.4', '255.255.255.255']:
+            self.assertTrue(is_ipv4(ip), ip)
+
+    def test_invalid(self):
+        for ip in ['1.2.3', '1.2.3.4.5', '1.2.3.256', '01.2.3.4',
+                   '1.2.3.-4', '1.2.3.٤', '', 'a.b.c.d', '1.2.3.4/24']:
+            self.assertFalse(is_ipv4(ip), ip)
+
+
+class TestNormalizeIP(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize_ip('1.2.3.4'), '1.2.3.4')
+        self.assertEqual(normalize_ip('1.2.3.4/24'), '1.2.3.0/24')
+        self.assertEqual(normalize_ip('2001:DB8:0::1'), '2001:db8::1')
+        self.assertEqual(normalize_ip('2001:db8::1/64'), '2001:db8::/64')
+
+    def test_invalid(self):
+        for ip in ['1.2.3.256', '01.2.3.4', 'foo', '2001:db8:::1',
+                   '1.2.3.4/33']:
+            with self.assertRaises(ValueError):
+                normalize_ip(ip)
+
+
+class TestValidateIPs(unittest.TestCase):
+    def test_dedupe(self):
+        result = validate_ips([
+            '1.2.3.4\n', '\n', '# comment\n', '1.2.3[.]4\n', '5.6.7.8\n',
+            '1.2.3.4\n', '2001:DB8::1\n', '2001:db8::1\n'])
+        self.assertEqual(
+            result.valid, ['1.2.3.4', '5.6.7.8', '2001:db8::1'])
+        self.assertEqual(result.invalid, [])
+
+    def test_invalid(self):
+        result = validate_ips(['1.2.3.4\n', '1.2.3.256\n', 'foo\n'])
+        self.assertEqual(result.valid, ['1.2.3.4'])
+        self.assertEqual(
+            [(lineno, line) for lineno, line, _ in result.invalid],
+            [(2, '1.2.3.256'), (3, 'foo')])
+        self.assertIn('256', result.invalid[0][2])
+        for _, _, reason in result.invalid:
+            self.assertTrue(reason)
+
+    def test_collapse(self):
+        result = validate_ips(
+            ['10.0.0.%i' % i for i in range(256)] +
+            ['10.0.1.1', '2001:db8::1', '2001:db8::'],
+            collapse=True)
+        self.assertEqual(
+            result.valid, ['10.0.0.0/24', '10.0.1.1', '2001:db8::/127'])
+
+    def test_collapse_max_prefix(self):
+        result = validate_ips(['10.0.0.0/22', '2001:db8::/119'],
+                              collapse=True)
+        self.assertEqual(result.valid, [
+            '10.0.0.0/24', '10.0.1.0/24', '10.0.2.0/24', '10.0.3.0/24',
+            '2001:db8::/120', '2001:db8::100/120'])
+
+
+if __name__ == '__main__':
+    unittest.main()
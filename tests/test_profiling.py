@@ -0,0 +1,63 @@
+import time
+import unittest
+
+from pybinaryedge.api import BinaryEdge
+from pybinaryedge.profiling import Profiler
+
+
+class FakeResponse(object):
+    status_code = 200
+    headers = {}
+    content = b'{}'
+
+    def json(self):
+        return {'ip': '1.1.1.1'}
+
+
+class FakeSession(object):
+    def get(self, url, params=None, headers=None, stream=False):
+        # Bodies are streamed to time the download apart
+        assert stream
+        return FakeResponse()
+
+
+class TestProfiler(unittest.TestCase):
+    def test_phase(self):
+        profiler = Profiler()
+        for _ in range(2):
+            with profiler.phase('sleep'):
+                time.sleep(0.01)
+        with self.assertRaises(KeyError):
+            with profiler.phase('error'):
+                raise KeyError()
+        self.assertEqual(profiler.counts, {'sleep': 2, 'error': 1})
+        self.assertGreaterEqual(profiler.times['sleep'], 0.02)
+
+    def test_client_phases(self):
+        be = BinaryEdge('key', profile=True)
+        be.requests = FakeSession()
+        be.host('1.1.1.1')
+        be.host('1.1.1.1')
+        self.assertEqual(be.profiler.counts, {
+            'validate': 2, 'connect/wait': 2, 'download': 2, 'decode': 2})
+
+    def test_summary(self):
+        profiler = Profiler()
+        profiler.record('connect/wait', 3.0)
+        profiler.record('connect/wait', 1.0)
+        profiler.record('decode', 1.0)
+        lines = profiler.summary().split('\n')
+        self.assertEqual(lines[0].split(), [
+            'Phase', 'Calls', 'Total', '(s)', 'Mean', '(ms)', '%'])
+        self.assertEqual(lines[1].split(), [
+            'connect/wait', '2', '4.000', '2000.000', '80.0%'])
+        self.assertEqual(lines[2].split(), [
+            'decode', '1', '1.000', '1000.000', '20.0%'])
+
+    def test_disabled(self):
+        be = BinaryEdge('key')
+        self.assertIsNone(be.profiler)
+
+
+if __name__ == '__main__':
+    unittest.main()
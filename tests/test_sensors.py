@@ -0,0 +1,35 @@
+import random
+import unittest
+from collections import Counter
+
+from pybinaryedge.sensors import SpaceSaving
+
+
+class TestSpaceSaving(unittest.TestCase):
+    def test_exact_under_capacity(self):
+        counter = SpaceSaving(10)
+        data = [random.randrange(10) for _ in range(1000)]
+        for d in data:
+            counter.add(d)
+        self.assertEqual(counter.counts, dict(Counter(data)))
+
+    def test_eviction(self):
+        counter = SpaceSaving(2)
+        for key in ['a', 'a', 'a', 'b', 'c']:
+            counter.add(key)
+        # c replaces b, inheriting its count
+        self.assertEqual(counter.counts, {'a': 3, 'c': 2})
+        self.assertEqual(counter.total, 5)
+
+    def test_top(self):
+        random.seed(0)
+        counter = SpaceSaving(50)
+        data = [int(random.paretovariate(1.2)) for _ in range(20000)]
+        for d in data:
+            counter.add(d)
+        self.assertEqual(len(counter.counts), 50)
+        self.assertEqual(counter.top(5), Counter(data).most_common(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
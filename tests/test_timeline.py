@@ -0,0 +1,82 @@
+import unittest
+
+from pybinaryedge.timeline import (Timeline, host_key, iter_results,
+                                   torrent_key)
+
+
+def host_event(ts, port=80, product='nginx', version='1.0'):
+    return {
+        'origin': {'ts': ts},
+        'target': {'port': port},
+        'result': {'data': {'service': {
+            'name': 'http', 'product': product, 'version': version}}},
+    }
+
+
+NGINX = (80, 'http', 'nginx', '1.0')
+
+
+class TestKeys(unittest.TestCase):
+    def test_host_key(self):
+        self.assertEqual(host_key(host_event(5)), (5, NGINX))
+        self.assertIsNone(host_key({'target': {'port': 80}}))
+
+    def test_null_values(self):
+        self.assertIsNone(host_key({'origin': None}))
+        self.assertEqual(
+            host_key({'origin': {'ts': 5}, 'target': None,
+                      'result': {'data': None}}),
+            (5, (None, None, None, None)))
+        self.assertEqual(
+            torrent_key({'origin': {'ts': 5}, 'peer': None,
+                         'torrent': None}),
+            (5, (None, 'torrent', None, None)))
+
+    def test_iter_results(self):
+        res = {'events': [
+            {'port': 80, 'results': [host_event(1), host_event(2)]},
+            host_event(3)]}
+        self.assertEqual(len(list(iter_results(res))), 3)
+
+
+class TestTimeline(unittest.TestCase):
+    def test_gap(self):
+        timeline = Timeline(gap=10)
+        timeline.consume({'events': [
+            host_event(ts) for ts in [0, 5, 15, 40, 45]]})
+        self.assertEqual(timeline.intervals[NGINX], [[0, 15, 3], [40, 45, 2]])
+        self.assertEqual(timeline.first_seen(NGINX), 0)
+        self.assertEqual(timeline.last_seen(NGINX), 45)
+        self.assertEqual(timeline.seen_at(10), [NGINX])
+        self.assertEqual(timeline.seen_at(30), [])
+
+    def test_out_of_order(self):
+        timeline = Timeline(gap=10)
+        timeline.consume({'events': [host_event(ts) for ts in [40, 0]]})
+        timeline.consume({'events': [host_event(ts) for ts in [30, 20]]})
+        self.assertEqual(timeline.intervals[NGINX], [[0, 0, 1], [20, 40, 3]])
+        # 10 bridges the two intervals
+        timeline.consume({'events': [host_event(10)]})
+        self.assertEqual(timeline.intervals[NGINX], [[0, 40, 5]])
+
+    def test_diff(self):
+        old = Timeline().consume({'events': [host_event(0)]})
+        new = Timeline().consume({'events': [host_event(1, port=443)]})
+        self.assertEqual(old.diff(new), {
+            'removed': [NGINX],
+            'added': [(443, 'http', 'nginx', '1.0')]})
+
+    def test_compact(self):
+        timeline = Timeline(gap=10)
+        timeline.consume({'events': [
+            host_event(0), host_event(50), host_event(5, port=443)]})
+        data = timeline.to_compact()
+        self.assertEqual(len(data['keys']), 2)
+        loaded = Timeline.from_compact(data)
+        self.assertEqual(loaded.gap, 10)
+        self.assertEqual(loaded.intervals, timeline.intervals)
+        self.assertEqual(loaded.keys(), timeline.keys())
+
+
+if __name__ == '__main__':
+    unittest.main()
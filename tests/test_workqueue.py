@@ -0,0 +1,201 @@
+import functools
+import json
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+
+from pybinaryedge import workqueue
+from pybinaryedge.api import BinaryEdge, BinaryEdgeNotFound
+
+
+def fake_host(self, ip):
+    if ip == '9.9.9.9':
+        raise BinaryEdgeNotFound()
+    return {'ip': ip}
+
+
+class TestSQLiteQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'queue')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_claim(self):
+        queue = workqueue.SQLiteQueue(self.path)
+        self.assertEqual(queue.put(['a', 'b', 'c', 'a']), 3)
+        self.assertEqual([t for _, t in queue.claim(2)], ['a', 'b'])
+        self.assertEqual([t for _, t in queue.claim(2)], ['c'])
+        self.assertEqual(queue.claim(2), [])
+        self.assertEqual(queue.pending(), 3)
+
+    def test_lease_expiry(self):
+        queue = workqueue.SQLiteQueue(self.path, lease=0.05)
+        queue.put(['a', 'b'])
+        tasks = queue.claim(2)
+        queue.ack(tasks[0][0])
+        self.assertEqual(queue.claim(2), [])
+        time.sleep(0.1)
+        self.assertEqual([t for _, t in queue.claim(2)], ['b'])
+
+    def test_renew(self):
+        queue = workqueue.SQLiteQueue(self.path, lease=0.05)
+        queue.put(['a'])
+        tasks = queue.claim(1)
+        time.sleep(0.1)
+        queue.renew([tasks[0][0]])
+        self.assertEqual(queue.claim(1), [])
+
+    def test_fail(self):
+        queue = workqueue.SQLiteQueue(self.path)
+        queue.put(['a'])
+        task_id = queue.claim(1)[0][0]
+        self.assertTrue(queue.fail(task_id, 2))
+        self.assertEqual(queue.claim(1), [(task_id, 'a')])
+        self.assertFalse(queue.fail(task_id, 2))
+        self.assertEqual(queue.pending(), 0)
+        self.assertIsNone(queue.next_available())
+
+    def test_fail_delay(self):
+        queue = workqueue.SQLiteQueue(self.path)
+        queue.put(['a'])
+        task_id = queue.claim(1)[0][0]
+        queue.fail(task_id, 3, 60)
+        self.assertEqual(queue.claim(1), [])
+        self.assertGreater(queue.next_available(), time.time() + 50)
+
+    def test_abstract_backend(self):
+        with self.assertRaises(TypeError):
+            workqueue.QueueBackend()
+
+
+class TestWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = os.path.join(self.tmp.name, 'queue')
+        self.output = os.path.join(self.tmp.name, 'out.ndjson')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    @mock.patch.object(BinaryEdge, 'host', fake_host)
+    def test_worker(self):
+        workqueue.SQLiteQueue(self.queue).put(['1.1.1.1', '9.9.9.9'])
+        self.assertEqual(workqueue.worker('key', self.queue, self.output), 2)
+        self.assertEqual(self.read(self.output), [
+            {'target': '1.1.1.1', 'result': {'ip': '1.1.1.1'}},
+            {'target': '9.9.9.9', 'error': 'Search term not found'},
+        ])
+
+    def test_worker_network_error(self):
+        calls = []
+
+        def host(self, ip):
+            calls.append(ip)
+            if len(calls) == 1:
+                raise requests.ConnectionError('Connection reset')
+            return {'ip': ip}
+
+        workqueue.SQLiteQueue(self.queue).put(['1.1.1.1'])
+        with mock.patch.object(BinaryEdge, 'host', host):
+            self.assertEqual(workqueue.worker(
+                'key', self.queue, self.output, retry_delay=0), 1)
+        self.assertEqual(calls, ['1.1.1.1', '1.1.1.1'])
+        self.assertEqual(self.read(self.output), [
+            {'target': '1.1.1.1', 'result': {'ip': '1.1.1.1'}}])
+
+    def test_worker_invalid_target(self):
+        calls = []
+
+        def host(self, ip):
+            calls.append(ip)
+            raise ValueError('Invalid IP address: %s' % ip)
+
+        queue = functools.partial(workqueue.SQLiteQueue, self.queue)
+        queue().put(['foo'])
+        with mock.patch.object(BinaryEdge, 'host', host):
+            self.assertEqual(workqueue.worker('key', queue, self.output), 1)
+        self.assertEqual(calls, ['foo'])
+        self.assertEqual(self.read(self.output), [
+            {'target': 'foo', 'error': 'Invalid IP address: foo'}])
+        self.assertEqual(queue().pending(), 0)
+
+    def test_worker_compressed_output(self):
+        with self.assertRaises(ValueError):
+            workqueue.worker('key', self.queue, self.output + '.xz')
+
+    def test_merge_ndjson(self):
+        parts = []
+        for i, targets in enumerate([['a', 'b'], ['b', 'c']]):
+            parts.append(os.path.join(self.tmp.name, 'part%i' % i))
+            with open(parts[-1], 'w') as f:
+                for target in targets:
+                    f.write(json.dumps({'target': target}) + '\n')
+        self.assertEqual(workqueue.merge_ndjson(parts, self.output), 3)
+        self.assertEqual(
+            [line['target'] for line in self.read(self.output)],
+            ['a', 'b', 'c'])
+
+    @mock.patch.object(BinaryEdge, 'host', fake_host)
+    @mock.patch.object(workqueue, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    def test_run_twice(self):
+        workqueue.run(
+            'key', ['1.1.1.1', '2.2.2.2'], self.output, processes=2)
+        self.assertFalse(os.path.exists(self.output + '.queue'))
+        count = workqueue.run(
+            'key', ['1.1.1.1', '2.2.2.2', '3.3.3.3'], self.output,
+            processes=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            sorted(line['target'] for line in self.read(self.output)),
+            ['1.1.1.1', '2.2.2.2', '3.3.3.3'])
+
+    @mock.patch.object(BinaryEdge, 'host', fake_host)
+    @mock.patch.object(workqueue, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    def test_run_expired_lease(self):
+        # Lease left by a worker which crashed before acknowledging it
+        path = self.output + '.queue'
+        queue = workqueue.SQLiteQueue(path, lease=0.2)
+        queue.put(['1.1.1.1', '2.2.2.2'])
+        queue.claim(1)
+        count = workqueue.run('key', ['2.2.2.2'], self.output, processes=2)
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            sorted(line['target'] for line in self.read(self.output)),
+            ['1.1.1.1', '2.2.2.2'])
+        self.assertFalse(os.path.exists(path))
+
+    @mock.patch.object(BinaryEdge, 'host', fake_host)
+    @mock.patch.object(workqueue, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    def test_run_timeout(self):
+        path = self.output + '.queue'
+        queue = workqueue.SQLiteQueue(path)
+        queue.put(['1.1.1.1'])
+        task_id = queue.claim(1)[0][0]
+        with self.assertRaises(workqueue.IncompleteRun) as ctx:
+            workqueue.run(
+                'key', ['2.2.2.2'], self.output, processes=1, timeout=0)
+        self.assertEqual(ctx.exception.pending, 1)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(self.output))
+        # Once the task is given back, the next run finishes the job
+        queue.fail(task_id, 3)
+        self.assertEqual(
+            workqueue.run('key', [], self.output, processes=1), 2)
+        self.assertEqual(
+            sorted(line['target'] for line in self.read(self.output)),
+            ['1.1.1.1', '2.2.2.2'])
+
+
+if __name__ == '__main__':
+    unittest.main()